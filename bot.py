@@ -1,12 +1,27 @@
 import os
 import re
+import math
+import time
+import logging
+import sqlite3
+import weakref
 import asyncio
+from collections import OrderedDict
+from contextlib import closing
+from functools import lru_cache
+from io import BytesIO
 from pathlib import Path
+from urllib.parse import urlsplit
 
+import httpx
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 import uvicorn
+import uvloop
+from PIL import Image, ImageDraw, ImageFont
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -16,7 +31,10 @@ from telegram.ext import (
     filters,
 )
 
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+
+logger = logging.getLogger(__name__)
 
 
 # ============================
@@ -28,18 +46,108 @@ if not BOT_TOKEN:
 
 
 BASE_URL = "https://vehiclescore.co.uk/score?registration={reg}"
+HOME_URL = "https://vehiclescore.co.uk/"
+
+# Warm BrowserContexts kept ready; each is recycled after CONTEXT_MAX_USES shots
+POOL_SIZE = int(os.environ.get("POOL_SIZE", "4"))
+CONTEXT_MAX_USES = int(os.environ.get("CONTEXT_MAX_USES", "50"))
+
+# Smaller viewport + JPEG: far fewer pixels to encode and upload.
+# Tunable per deploy: a narrower layout may give a shorter, denser page.
+VIEWPORT = {
+    "width": int(os.environ.get("VIEWPORT_WIDTH", "1100")),
+    "height": int(os.environ.get("VIEWPORT_HEIGHT", "800")),
+}
+JPEG_QUALITY = 85
+
+# Telegram rejects photos with width + height > 10000, so taller full-page
+# shots are cut into equal slices of at most this height (sent as one album,
+# max 10; anything below 10 * MAX_SLICE_HEIGHT px is dropped)
+MAX_SLICE_HEIGHT = 4000
+MAX_SLICES = 10
+TRUNCATED_NOTE = "(صفحه خیلی بلند بود؛ فقط بخش بالایی فرستاده شد)"
+
+# In-page helpers (score wait, auto-scroll, no-animations CSS), installed
+# once per context
+HELPERS_JS = Path(__file__).with_name("helpers.js")
+
+# Hard deadline per render (fast path included); the page goes back to the
+# pool when it fires. The waits are sized to fit under RENDER_TIMEOUT
+# (fast path 2 + goto 10 + score 15 + settle 3 + consent 1.5 + card 3
+# = 34.5 s worst case)
+RENDER_TIMEOUT = 35
+FAST_PATH_TIMEOUT = 2
+FULL_PAGE_RENDER_TIMEOUT = 60
+GOTO_TIMEOUT_MS = 10000
+SCORE_VISIBLE_TIMEOUT_MS = 15000
+SCORE_SETTLE_TIMEOUT_MS = 3000
+CARD_VISIBLE_TIMEOUT_MS = 3000
+
+# Element holding the vehicle score; page is "ready" once its text settles
+SCORE_SELECTOR = "[class*=score]"
+
+# Server-rendered score (e.g. embedded JSON); when present no browser is needed
+FAST_SCORE_RE = re.compile(r'"score"\s*:\s*(\d{2,4})')
+
+# Cookie/consent banner buttons, matched in a single query (one CDP roundtrip).
+# Whole-text match only: :has-text() is a substring match, so 'OK' would also
+# hit "Look up"/"Book" and could submit the site's lookup form
+CONSENT_SELECTOR = 'button:text-matches("^(accept( all)?|i agree|got it|ok)$", "i")'
+
+# Default shot is just the score card; "Full page" renders the whole page
+SCORE_CARD_SELECTOR = ".score-card, [class*='score']"
+
+# Heavy third-party resources + trackers are aborted before they download
+SITE_HOST = "vehiclescore.co.uk"
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+# Never needed for the screenshot, not even from the site itself
+ALWAYS_BLOCKED_RESOURCE_TYPES = {"ping", "manifest", "texttrack"}
+BLOCKED_HOSTS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "googleadservices.com",
+    "adservice.google.com",
+    "facebook.net",
+    "connect.facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "taboola.com",
+    "outbrain.com",
+    "criteo.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "segment.io",
+    "mixpanel.com",
+    "nr-data.net",
+    "sentry.io",
+    "tiktok.com",
+)
+
+# Per-user screenshot rate limit: 1 token / 10 s, bursts of 2
+SHOT_RATE = 1 / 10
+SHOT_BURST = 2
 
-TMP_DIR = Path("/tmp")
-TMP_DIR.mkdir(parents=True, exist_ok=True)
+# Screenshots already sent are re-sent by Telegram file_id for this long
+SHOT_CACHE_TTL = 6 * 60 * 60
+SHOT_CACHE_MAX = 2048
+
+# file_ids are also persisted here so they survive restarts/deploys.
+# /data is the Fly volume mounted in fly.toml ([mounts]); /tmp would be wiped
+SHOT_DB = os.environ.get("SHOT_DB", "/data/shots.sqlite3")
 
 # UK-ish simple plate validator (strict enough for your use)
-PLATE_RE = re.compile(r"^[A-Z0-9]{2,8}$", re.IGNORECASE)
+# (input is uppercased first, so no IGNORECASE needed)
+PLATE_RE = re.compile(r"[A-Z0-9]{2,8}")
 
 
 # ============================
 # FastAPI Health (for Fly)
 # ============================
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 
 @app.get("/health")
@@ -52,7 +160,15 @@ async def run_web():
     Must listen on 0.0.0.0:$PORT so Fly smoke checks pass.
     """
     port = int(os.environ.get("PORT", "8080"))
-    config = uvicorn.Config(app, host="0.0.0.0", port=port, log_level="info")
+    # Fly probes /health every few seconds: no access log line per probe
+    config = uvicorn.Config(
+        app,
+        host="0.0.0.0",
+        port=port,
+        log_level="warning",
+        access_log=False,
+        http="httptools",
+    )
     server = uvicorn.Server(config)
     await server.serve()
 
@@ -60,111 +176,600 @@ async def run_web():
 # ============================
 # Helpers
 # ============================
-def normalize_plate(text: str) -> str:
-    return (text or "").strip().upper().replace(" ", "")
+_PLATE_STRIP = str.maketrans("", "", " \t\n\r\xa0")
+
+
+@lru_cache(maxsize=1024)
+def parse_plate(text: str) -> str | None:
+    """
+    Normalized plate (whitespace removed, uppercased), or None if invalid.
+    Cached: repeat plates skip the strip + regex entirely.
+    """
+    plate = text.translate(_PLATE_STRIP).upper()
+    return plate if PLATE_RE.fullmatch(plate) else None
+
+
+# "PLATE" / "PLATE:full" -> (expires_at, telegram file_id)
+# LRU order: least recently used first, evicted past SHOT_CACHE_MAX
+SHOT_CACHE: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+
+def get_cached_shot(key: str) -> str | None:
+    entry = SHOT_CACHE.get(key)
+    if entry is None:
+        return None
+
+    expires_at, file_id = entry
+    if expires_at < time.time():
+        SHOT_CACHE.pop(key, None)
+        return None
+
+    SHOT_CACHE.move_to_end(key)
+    return file_id
+
+
+def cache_shot(key: str, file_id: str, expires_at: float | None = None) -> None:
+    if expires_at is None:
+        expires_at = time.time() + SHOT_CACHE_TTL
+
+    SHOT_CACHE[key] = (expires_at, file_id)
+    SHOT_CACHE.move_to_end(key)
+    while len(SHOT_CACHE) > SHOT_CACHE_MAX:
+        SHOT_CACHE.popitem(last=False)
 
 
 # ============================
-# Playwright screenshot
+# Persistent file_id store (SQLite)
 # ============================
-async def take_screenshot_full(url: str, out_path: str) -> None:
+# sqlite3 is blocking: every call runs off-loop via asyncio.to_thread,
+# each on its own short-lived connection
+def _db_connect() -> sqlite3.Connection:
+    return sqlite3.connect(SHOT_DB, timeout=5)
+
+
+def _db_prune(conn: sqlite3.Connection, now: int) -> None:
+    # Expired rows are never served again; keeps the volume from filling up
+    conn.execute("DELETE FROM screenshots WHERE ts < ?", (now - SHOT_CACHE_TTL,))
+
+
+def _db_init() -> None:
+    Path(SHOT_DB).parent.mkdir(parents=True, exist_ok=True)
+    with closing(_db_connect()) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS screenshots ("
+            "key TEXT PRIMARY KEY, file_id TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS screenshots_ts ON screenshots (ts)")
+        _db_prune(conn, int(time.time()))
+
+
+def _db_get(key: str) -> tuple[str, int] | None:
+    with closing(_db_connect()) as conn, conn:
+        return conn.execute(
+            "SELECT file_id, ts FROM screenshots WHERE key = ?", (key,)
+        ).fetchone()
+
+
+def _db_put(key: str, file_id: str, ts: int) -> None:
+    with closing(_db_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO screenshots (key, file_id, ts) VALUES (?, ?, ?)",
+            (key, file_id, ts),
+        )
+        _db_prune(conn, ts)
+
+
+def _db_delete(key: str) -> None:
+    with closing(_db_connect()) as conn, conn:
+        conn.execute("DELETE FROM screenshots WHERE key = ?", (key,))
+
+
+async def init_shot_db() -> None:
+    try:
+        await asyncio.to_thread(_db_init)
+    except (sqlite3.Error, OSError):
+        # Not fatal: the in-memory cache still works, only restarts lose it
+        logger.warning("file_id DB unavailable at %s", SHOT_DB, exc_info=True)
+
+
+async def load_shot(key: str) -> str | None:
     """
-    - Loads page
-    - Waits for SPA to render + score to stabilize
-    - Tries to detect the main scroll container (or falls back to document)
-    - Scrolls down repeatedly until scrollHeight stops changing
-    - Takes full_page screenshot
-    """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"],
+    Memory first, then SQLite (e.g. right after a deploy).
+    """
+    file_id = get_cached_shot(key)
+    if file_id:
+        return file_id
+
+    try:
+        row = await asyncio.to_thread(_db_get, key)
+    except sqlite3.Error:
+        return None
+    if row is None:
+        return None
+
+    file_id, ts = row
+    expires_at = ts + SHOT_CACHE_TTL
+    if expires_at < time.time():
+        return None
+
+    cache_shot(key, file_id, expires_at)
+    return file_id
+
+
+async def save_shot(key: str, file_id: str) -> None:
+    cache_shot(key, file_id)
+    try:
+        await asyncio.to_thread(_db_put, key, file_id, int(time.time()))
+    except sqlite3.Error:
+        pass
+
+
+async def forget_shot(key: str) -> None:
+    SHOT_CACHE.pop(key, None)
+    try:
+        await asyncio.to_thread(_db_delete, key)
+    except sqlite3.Error:
+        pass
+
+
+# ============================
+# HTTP fast path (no browser)
+# ============================
+_http = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http
+
+    if _http is None:
+        _http = httpx.AsyncClient(
+            http2=True,
+            timeout=8,
+            follow_redirects=True,
+            headers={"User-Agent": "Mozilla/5.0"},
         )
+    return _http
 
-        context = await browser.new_context(
-            viewport={"width": 1440, "height": 900},
-            device_scale_factor=1,
+
+async def close_http_client() -> None:
+    global _http
+
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+def render_score_card(plate: str, score: str) -> bytes:
+    """
+    Draws a small "PLATE / Score" JPEG locally (used instead of a screenshot).
+    """
+    img = Image.new("RGB", (600, 300), "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((40, 40), plate, fill="black", font=ImageFont.load_default(size=56))
+    draw.text((40, 150), f"Score: {score}", fill="black", font=ImageFont.load_default(size=72))
+
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=JPEG_QUALITY)
+    return out.getvalue()
+
+
+async def try_fast_path(url: str, plate: str) -> bytes | None:
+    """
+    - Plain GET of the score page (~300 ms instead of 10-20 s of Chromium)
+    - If the score is in the initial HTML, renders a score card from it
+    - Returns None when the page needs JS (caller falls back to Playwright)
+    """
+    try:
+        # Total cap: httpx's own timeout applies per phase (connect/read/...)
+        resp = await asyncio.wait_for(get_http_client().get(url), FAST_PATH_TIMEOUT)
+        resp.raise_for_status()
+    except (httpx.HTTPError, asyncio.TimeoutError):
+        return None
+
+    m = FAST_SCORE_RE.search(resp.text)
+    if not m:
+        return None
+
+    return await asyncio.to_thread(render_score_card, plate, m.group(1))
+
+
+# ============================
+# Shared Playwright browser
+# ============================
+_pw = None
+_browser = None
+_pool = None
+_browser_lock = asyncio.Lock()
+
+# Catches a fork after import (e.g. gunicorn --preload, os.fork): the child
+# must not start a second driver. It can't see spawn-started workers such
+# as uvicorn --workers, which re-import the module; run python bot.py only
+_PW_OWNER_PID = os.getpid()
+
+
+async def get_browser():
+    """
+    Launches Chromium once and reuses it for every screenshot.
+    """
+    global _pw, _browser
+
+    if os.getpid() != _PW_OWNER_PID:
+        raise RuntimeError(
+            "Playwright was started from a process forked after import "
+            "(e.g. gunicorn --preload). Run a single process: python bot.py"
         )
-        page = await context.new_page()
 
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _pw is None:
+                _pw = await async_playwright().start()
+            _browser = await _pw.chromium.launch(
+                headless=True,
+                args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"],
+            )
+        return _browser
+
+
+def _host_matches(host: str, domain: str) -> bool:
+    return host == domain or host.endswith("." + domain)
+
+
+async def block_heavy_requests(route) -> None:
+    """
+    - Ads/analytics hosts, beacons, manifests: always aborted
+    - images/fonts/media/stylesheets: aborted unless served by vehiclescore
+      (keeps the site's own CSS and score graphics)
+    - everything else (document, script, xhr/fetch): allowed
+    """
+    request = route.request
+    resource_type = request.resource_type
+    host = urlsplit(request.url).hostname or ""
+
+    if (
+        resource_type in ALWAYS_BLOCKED_RESOURCE_TYPES
+        or any(_host_matches(host, h) for h in BLOCKED_HOSTS)
+        or (
+            resource_type in BLOCKED_RESOURCE_TYPES
+            and not _host_matches(host, SITE_HOST)
+        )
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class ContextPool:
+    """
+    Fixed-size pool of pre-created BrowserContexts, each with one open Page.
+    - acquire() hands out a ready page; waits when all are busy
+      (caps memory + concurrency)
+    - release() blanks the page, clears cookies (HTTP cache is kept) and
+      puts it back; release_soon() does that in its own task
+    - a context is closed and replaced after max_uses shots (bounds the
+      per-context memory Playwright/Chromium accumulate over time)
+    """
+
+    def __init__(self, browser, size: int, max_uses: int):
+        self.browser = browser
+        self.size = size
+        self.max_uses = max_uses
+        # LIFO: the most recently used context (warmest HTTP cache) goes first
+        self._queue: asyncio.Queue = asyncio.LifoQueue(maxsize=size)
+        self._uses: dict = {}
+        # Background releases/refills (strong refs so they aren't GC'd)
+        self._tasks: set = set()
+
+    async def _new_page(self):
+        context = await self.browser.new_context(
+            viewport=VIEWPORT,
+            device_scale_factor=1,
+            # No SW prefetching bundles in the background; no CSS animations
+            # (prefers-reduced-motion) delaying the rendered state
+            service_workers="block",
+            reduced_motion="reduce",
+        )
+        try:
+            await context.route("**/*", block_heavy_requests)
+            await context.add_init_script(path=HELPERS_JS)
+            page = await context.new_page()
+        except BaseException:
+            await asyncio.shield(context.close())
+            raise
+        self._uses[page] = 0
+        return page
+
+    async def start(self) -> None:
+        """
+        Opens all slots; on any failure closes the ones already opened and
+        re-raises, so a half-built pool never gets used.
+        """
         try:
-            # Avoid networkidle (can hang on modern sites)
-            await page.goto(url, wait_until="domcontentloaded", timeout=45000)
+            for _ in range(self.size):
+                await self._queue.put(await self._new_page())
+        except BaseException:
+            while not self._queue.empty():
+                page = self._queue.get_nowait()
+                try:
+                    await asyncio.shield(page.context.close())
+                except Exception:
+                    pass
+            raise
+
+    async def acquire(self):
+        page = await self._queue.get()
+        self._uses[page] += 1
+        return page
+
+    async def release(self, page) -> None:
+        reusable = self._uses.get(page, 0) < self.max_uses and not page.is_closed()
+        if reusable:
+            try:
+                # Short timeout: a stuck page is cheaper to replace than wait on
+                await page.goto("about:blank", timeout=3000)
+                await page.context.clear_cookies()
+            except Exception:
+                reusable = False
+
+        if not reusable:
+            # Worn out or broken: replace it so the pool never shrinks
+            self._uses.pop(page, None)
+            try:
+                await page.context.close()
+            except Exception:
+                pass
+            try:
+                page = await self._new_page()
+            except Exception:
+                # Never fail the (finished) render over this; refill later
+                logger.warning("Could not replace pooled page, retrying in background", exc_info=True)
+                self._spawn(self._refill())
+                return
+
+        await self._queue.put(page)
+
+    def release_soon(self, page) -> None:
+        """
+        Releases the page in a separate task, so the caller's cancellation
+        (e.g. the render deadline firing) can never interrupt the reset and
+        lose the slot, and a finished render returns without waiting for it.
+        """
+        self._spawn(self.release(page))
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self) -> None:
+        delay = 1
+        while True:
+            await asyncio.sleep(delay)
+            if not self.browser.is_connected():
+                # Browser gone: get_pool() builds a fresh pool on the next one
+                return
+            try:
+                page = await self._new_page()
+            except Exception:
+                logger.warning("Pooled page refill failed", exc_info=True)
+                delay = min(delay * 2, 30)
+            else:
+                await self._queue.put(page)
+                return
+
+
+async def get_pool() -> ContextPool:
+    global _pool
+
+    browser = await get_browser()
+    async with _browser_lock:
+        if _pool is None or _pool.browser is not browser:
+            # Publish only a fully started pool: a failed start() must not
+            # leave a short (or empty) pool behind for every later request
+            pool = ContextPool(browser, POOL_SIZE, CONTEXT_MAX_USES)
+            await pool.start()
+            _pool = pool
+        return _pool
+
+
+async def close_browser() -> None:
+    """
+    Closes the shared browser and stops the node driver (no zombie processes).
+    """
+    global _pw, _browser, _pool
+
+    async with _browser_lock:
+        _pool = None
+        if _browser is not None:
+            try:
+                await _browser.close()
+            except Exception:
+                pass
+            _browser = None
+        if _pw is not None:
+            try:
+                await _pw.stop()
+            except Exception:
+                pass
+            _pw = None
 
-            # Give time to render
-            await page.wait_for_timeout(2500)
 
-            # Extra wait: score and sections often load after initial render
-            await page.wait_for_timeout(8000)
+# ============================
+# Playwright screenshot
+# ============================
+def slice_clips(
+    height: int, max_height: int = MAX_SLICE_HEIGHT, max_slices: int = MAX_SLICES
+) -> tuple[list[tuple[int, int]], bool]:
+    """
+    Splits a page of `height` px into (y, slice_height) clips of (almost)
+    equal height, so no slice ends up as a thin strip Telegram rejects
+    (aspect ratio > 20). Returns (clips, truncated).
+    """
+    truncated = height > max_height * max_slices
+    total = min(height, max_height * max_slices)
+    n = max(1, math.ceil(total / max_height))
+    step = math.ceil(total / n)
+    return [(y, min(step, total - y)) for y in range(0, total, step)], truncated
 
-            # Scroll logic: pick biggest scrollable container, else document
+
+async def take_screenshot(url: str, full_page: bool = False) -> tuple[list[bytes], bool]:
+    """
+    - Loads page
+    - Waits for SPA to render + score to stabilize
+    - Default: screenshots only the score card element (no scroll, no relayout)
+    - full_page=True:
+      - Scrolls the document down repeatedly until scrollHeight stops changing
+      - Takes full_page screenshot, sliced with clip= if the page is too tall
+    - Returns (JPEG bytes per image, truncated) - in memory, nothing on disk
+    """
+    pool = await get_pool()
+    page = await pool.acquire()
+
+    try:
+        # Return as soon as the response starts (fail fast on dead pages);
+        # actual readiness is gated by the waits below, never networkidle
+        await page.goto(url, wait_until="commit", timeout=GOTO_TIMEOUT_MS)
+
+        # Event-driven readiness (no fixed sleeps):
+        # 1) score element becomes visible
+        # 2) its text settles (unchanged between two short polls)
+        # Best-effort: on timeout we still screenshot whatever rendered.
+        try:
+            await page.wait_for_selector(
+                SCORE_SELECTOR, state="visible", timeout=SCORE_VISIBLE_TIMEOUT_MS
+            )
+            score_visible = True
+        except PlaywrightTimeoutError:
+            score_visible = False
+        else:
             await page.evaluate(
-                """
-                async () => {
-                  const sleep = (ms) => new Promise(r => setTimeout(r, ms));
-
-                  const getScroller = () => {
-                    const els = Array.from(document.querySelectorAll('*'));
-                    const scrollables = els.filter(el => {
-                      const s = getComputedStyle(el);
-                      const overflowY = s.overflowY;
-                      const canScroll = (overflowY === 'auto' || overflowY === 'scroll');
-                      return canScroll && el.scrollHeight > el.clientHeight + 300;
-                    });
-
-                    if (scrollables.length) {
-                      scrollables.sort((a,b) =>
-                        (b.scrollHeight - b.clientHeight) -
-                        (a.scrollHeight - a.clientHeight)
-                      );
-                      return scrollables[0];
-                    }
-
-                    return document.scrollingElement || document.documentElement;
-                  };
-
-                  const scroller = getScroller();
-
-                  let lastHeight = -1;
-                  let stableCount = 0;
-
-                  // Scroll down up to N steps; stop when height stops growing
-                  for (let i = 0; i < 35; i++) {
-                    scroller.scrollTo(0, scroller.scrollHeight);
-                    await sleep(1400);
-
-                    const h = scroller.scrollHeight;
-
-                    if (h === lastHeight) {
-                      stableCount++;
-                      if (stableCount >= 3) break;
-                    } else {
-                      stableCount = 0;
-                    }
-
-                    lastHeight = h;
-                  }
-
-                  // Let late content settle
-                  await sleep(1500);
-
-                  // Go top for nicer screenshot header
-                  scroller.scrollTo(0, 0);
-                  await sleep(900);
-                }
-                """
+                "([selector, timeout]) => window.__waitScore(selector, timeout)",
+                [SCORE_SELECTOR, SCORE_SETTLE_TIMEOUT_MS],
             )
 
-            await page.screenshot(path=out_path, full_page=True)
+        # Dismiss cookie banner so it doesn't cover the shot (best-effort)
+        try:
+            btn = await page.query_selector(CONSENT_SELECTOR)
+            if btn:
+                await btn.click(timeout=1500)
+        except Exception:
+            pass
+
+        if not full_page:
+            # No score rendered -> no card either; don't burn the deadline on it
+            card = None
+            if score_visible:
+                try:
+                    card = await page.wait_for_selector(
+                        SCORE_CARD_SELECTOR, state="visible", timeout=CARD_VISIBLE_TIMEOUT_MS
+                    )
+                except PlaywrightTimeoutError:
+                    pass
+
+            if card is not None:
+                return [await card.screenshot(type="jpeg", quality=JPEG_QUALITY)], False
+
+            # No card found: the visible viewport is the next best thing
+            return [await page.screenshot(type="jpeg", quality=JPEG_QUALITY)], False
+
+        await page.evaluate("() => window.__autoScroll()")
+
+        height = await page.evaluate("() => document.documentElement.scrollHeight")
+        if height <= MAX_SLICE_HEIGHT:
+            return [await page.screenshot(full_page=True, type="jpeg", quality=JPEG_QUALITY)], False
+
+        width = VIEWPORT["width"]
+        clips, truncated = slice_clips(height)
+        slices = []
+        for y, h in clips:
+            clip = {"x": 0, "y": y, "width": width, "height": h}
+            slices.append(await page.screenshot(
+                full_page=True, clip=clip, type="jpeg", quality=JPEG_QUALITY
+            ))
+        return slices, truncated
+
+    finally:
+        # Runs on CancelledError too (deadline hit): the reset happens in its
+        # own task, outside the deadline, so the page always returns to pool.
+        # Keep the browser + context + page alive for the next request
+        pool.release_soon(page)
 
+
+async def prewarm() -> None:
+    """
+    Opens the home page once in every pooled context at startup, so DNS,
+    TLS, HTTP cache and V8 are warm before the first real screenshot.
+    """
+    pool = await get_pool()
+
+    async def warm_one():
+        page = await pool.acquire()
+        try:
+            await page.goto(HOME_URL, wait_until="domcontentloaded", timeout=20000)
+        except Exception:
+            pass
         finally:
-            await context.close()
-            await browser.close()
+            await pool.release(page)
+
+    await asyncio.gather(*(warm_one() for _ in range(pool.size)))
+
+
+# ============================
+# Render dispatcher
+# ============================
+# (url, full_page) -> render already in progress
+_INFLIGHT: dict[tuple[str, bool], asyncio.Task] = {}
+
+
+async def _render_once(url: str, plate: str, full_page: bool) -> tuple[list[bytes], bool]:
+    if not full_page:
+        image = await try_fast_path(url, plate)
+        if image is not None:
+            return [image], False
+
+    return await take_screenshot(url, full_page)
+
+
+async def _render(url: str, plate: str, full_page: bool) -> tuple[list[bytes], bool]:
+    # One deadline for the whole render: fast path, waiting for a free pool
+    # context (the pool bounds concurrency) and the browser work all count
+    timeout = FULL_PAGE_RENDER_TIMEOUT if full_page else RENDER_TIMEOUT
+    return await asyncio.wait_for(_render_once(url, plate, full_page), timeout=timeout)
+
+
+async def render(url: str, plate: str, full_page: bool = False) -> tuple[list[bytes], bool]:
+    """
+    Identical requests arriving while a render is running share its result
+    instead of each launching their own page load.
+    """
+    key = (url, full_page)
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.create_task(_render(url, plate, full_page))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+
+    # shield: one impatient caller must not cancel the render for the others
+    return await asyncio.shield(task)
 
 
 # ============================
 # Telegram handlers
 # ============================
+# Same for every plate; only the link row depends on the plate
+_SHOT_BUTTONS = (
+    InlineKeyboardButton("📸 Screenshot", callback_data="shot"),
+    InlineKeyboardButton("📄 Full page", callback_data="shot_full"),
+)
+
+
+@lru_cache(maxsize=256)
+def plate_keyboard(plate: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        _SHOT_BUTTONS,
+        [InlineKeyboardButton("🔗 Open link", url=BASE_URL.format(reg=plate))],
+    ])
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "پلاک رو بفرست (مثال: VN64NWG)\n"
@@ -173,65 +778,227 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def on_plate_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    plate = normalize_plate(update.message.text)
+    plate = parse_plate(update.message.text)
 
-    if not PLATE_RE.match(plate):
+    if plate is None:
         await update.message.reply_text("فرمت پلاک درست نیست. مثال: VN64NWG")
         return
 
     context.user_data["plate"] = plate
 
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("📸 Screenshot", callback_data="shot")],
-        [InlineKeyboardButton("🔗 Open link", url=BASE_URL.format(reg=plate))],
-    ])
-
     await update.message.reply_text(
         f"پلاک: {plate}\nمی‌خوای اسکرین‌شات صفحه رو بگیرم؟",
-        reply_markup=keyboard
+        reply_markup=plate_keyboard(plate)
     )
 
 
+class TokenBucket:
+    """
+    Classic token bucket: refills at `rate` tokens/s up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def consume(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+# user_id -> bucket; stops button-spam from launching a render per tap.
+# Ordered by last use; a bucket idle long enough to be full again is
+# indistinguishable from a new one, so it is dropped
+_SHOT_BUCKETS: OrderedDict[int, TokenBucket] = OrderedDict()
+
+
+def allow_shot(user_id: int) -> bool:
+    now = time.monotonic()
+    while _SHOT_BUCKETS:
+        oldest = next(iter(_SHOT_BUCKETS.values()))
+        if now - oldest.last_refill < SHOT_BURST / SHOT_RATE:
+            break
+        _SHOT_BUCKETS.popitem(last=False)
+
+    bucket = _SHOT_BUCKETS.get(user_id)
+    if bucket is None:
+        bucket = _SHOT_BUCKETS[user_id] = TokenBucket(SHOT_RATE, SHOT_BURST)
+    _SHOT_BUCKETS.move_to_end(user_id)
+    return bucket.consume()
+
+
+# chat_id -> lock; entries vanish once no screenshot for that chat is running
+_CHAT_LOCKS: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def chat_lock(chat_id: int) -> asyncio.Lock:
+    lock = _CHAT_LOCKS.get(chat_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _CHAT_LOCKS[chat_id] = lock
+    return lock
+
+
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Runs as a non-blocking handler (block=False), so polling keeps going
+    while the screenshot renders. The per-chat lock keeps replies in order
+    within one chat; different chats run concurrently.
+    """
     query = update.callback_query
-    await query.answer()
 
-    if query.data != "shot":
+    if query.data not in ("shot", "shot_full"):
+        await query.answer()
+        return
+
+    if not allow_shot(query.from_user.id):
+        # Cheap rejection: just the callback toast, no message edit/render
+        await query.answer("⏳ چند ثانیه صبر کن و دوباره بزن.", show_alert=False)
         return
 
+    await query.answer()
+    full_page = query.data == "shot_full"
+
     plate = context.user_data.get("plate")
     if not plate:
         await query.edit_message_text("اول پلاک رو بفرست (مثال: VN64NWG)")
         return
 
+    async with chat_lock(query.message.chat.id):
+        await _do_screenshot(query, plate, full_page)
+
+
+async def send_shots(message, photos: list, plate: str, caption: str) -> list[str]:
+    """
+    Sends one photo, or an album for sliced full-page shots.
+    photos: JPEG bytes or Telegram file_ids. Returns the sent file_ids.
+    """
+    if len(photos) == 1:
+        # Raw bytes go straight into the multipart body (no BytesIO re-read)
+        msg = await message.reply_photo(
+            photo=photos[0], filename=f"{plate}.jpg", caption=caption
+        )
+        messages = [msg]
+    else:
+        messages = await message.reply_media_group(media=[
+            InputMediaPhoto(
+                media=photo,
+                filename=f"{plate}_{i + 1}.jpg",
+                caption=caption if i == 0 else None,
+            )
+            for i, photo in enumerate(photos)
+        ])
+
+    return [m.photo[-1].file_id for m in messages if m.photo]
+
+
+async def _do_screenshot(query, plate: str, full_page: bool) -> None:
     url = BASE_URL.format(reg=plate)
-    out_path = str(TMP_DIR / f"{plate}.png")
+    caption = f"{plate}\n{url}"
+    cache_key = f"{plate}:full" if full_page else plate
+
+    # Cache hit: Telegram re-serves the already uploaded photo(s), no Chromium
+    # (albums are cached as comma-separated file_ids, "|cut" if truncated)
+    cached = await load_shot(cache_key)
+    if cached:
+        file_ids, _, cut = cached.partition("|")
+        if cut:
+            caption = f"{caption}\n{TRUNCATED_NOTE}"
+        try:
+            await send_shots(query.message, file_ids.split(","), plate, caption)
+            return
+        except Exception:
+            await forget_shot(cache_key)
 
-    await query.edit_message_text(f"در حال گرفتن اسکرین‌شات کامل برای: {plate} ...")
+    if full_page:
+        status = f"در حال گرفتن اسکرین‌شات کامل برای: {plate} ..."
+    else:
+        status = f"در حال گرفتن اسکرین‌شات برای: {plate} ..."
+    try:
+        # Keep the buttons: the other shot type must stay one tap away
+        await query.edit_message_text(status, reply_markup=plate_keyboard(plate))
+    except BadRequest as e:
+        # Same button pressed again: text and keyboard are unchanged
+        if "not modified" not in str(e).lower():
+            raise
 
     try:
-        await take_screenshot_full(url, out_path)
-        await query.message.reply_photo(photo=open(out_path, "rb"), caption=f"{plate}\n{url}")
+        images, truncated = await render(url, plate, full_page)
+        if truncated:
+            caption = f"{caption}\n{TRUNCATED_NOTE}"
+
+        file_ids = await send_shots(query.message, images, plate, caption)
+        if len(file_ids) == len(images):
+            await save_shot(cache_key, ",".join(file_ids) + ("|cut" if truncated else ""))
+    except (PlaywrightTimeoutError, asyncio.TimeoutError):
+        await query.message.reply_text("سایت vehiclescore جواب نداد (timeout). کمی بعد دوباره امتحان کن.")
     except Exception as e:
         await query.message.reply_text(f"خطا: {type(e).__name__}: {e}")
-    finally:
-        try:
-            Path(out_path).unlink(missing_ok=True)
-        except Exception:
-            pass
 
 
 # ============================
 # Bot runner (PTB v20+ stable)
 # ============================
+async def post_init(application: Application) -> None:
+    """
+    Warm pre-launch: browser + contexts are ready before the first callback.
+    """
+    await init_shot_db()
+    application.bot_data["browser"] = await get_browser()
+    await get_pool()
+    application.bot_data["warmup"] = asyncio.create_task(prewarm())
+
+
+async def post_shutdown(application: Application) -> None:
+    task = application.bot_data.pop("warmup", None)
+    if task is not None:
+        task.cancel()
+
+    application.bot_data.pop("browser", None)
+    await close_browser()
+    await close_http_client()
+
+
 async def run_bot():
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Photo/album uploads use media_write_timeout (PTB default 20 s), which
+    # is too short for large full-page screenshots
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .media_write_timeout(60)
+        .pool_timeout(30)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_plate_text))
-    application.add_handler(CallbackQueryHandler(on_callback))
+    # block=False: a 20 s screenshot must not hold up other chats' updates
+    application.add_handler(CallbackQueryHandler(on_callback, block=False))
 
-    await application.run_polling(close_loop=False)
+    # run_polling() wants to own the event loop, but we share it with the
+    # web server, so drive the lifecycle (and the post_* hooks) by hand
+    async with application:
+        try:
+            await application.post_init(application)
+            await application.start()
+            await application.updater.start_polling()
+            await asyncio.Event().wait()  # until cancelled on shutdown
+        finally:
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.post_shutdown(application)
 
 
 # ============================
@@ -242,4 +1009,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # One uvloop loop shared by PTB polling and the uvicorn health server
+    # (uvloop.run replaces the deprecated uvloop.install() + asyncio.run)
+    uvloop.run(main())
@@ -0,0 +1,90 @@
+// Injected once per pooled BrowserContext (context.add_init_script), so each
+// screenshot only sends a tiny `window.__x()` call over CDP instead of the
+// whole script source.
+
+// Resolves true once the score text contains a digit and is unchanged
+// between two polls (~300 ms settle); resolves false after timeoutMs.
+window.__waitScore = async (selector, timeoutMs) => {
+  const sleep = (ms) => new Promise(r => setTimeout(r, ms));
+  const deadline = Date.now() + timeoutMs;
+  let last = null;
+
+  while (Date.now() < deadline) {
+    const el = document.querySelector(selector);
+    const text = el ? el.textContent.trim() : '';
+
+    if (text !== '' && text === last && /\d/.test(text)) return true;
+
+    last = text;
+    await sleep(300);
+  }
+  return false;
+};
+
+// Scroll the document down until lazy sections stop loading.
+// full_page screenshots capture the top-level scroller anyway, so there is
+// no need to scan every element for a custom scroll container.
+// Done = scrollHeight unchanged across two frames AND no DOM mutations for
+// quietMs; capped at maxMs.
+window.__autoScroll = async (quietMs = 500, maxMs = 15000) => {
+  const frames = () => new Promise(r => requestAnimationFrame(() => requestAnimationFrame(r)));
+
+  const scroller = document.scrollingElement || document.documentElement;
+  const deadline = Date.now() + maxMs;
+
+  let lastMutation = Date.now();
+  const observer = new MutationObserver(() => { lastMutation = Date.now(); });
+  observer.observe(document.body || document.documentElement, { childList: true, subtree: true });
+
+  try {
+    let lastHeight = -1;
+
+    while (Date.now() < deadline) {
+      const footer = document.querySelector('footer');
+      if (footer) footer.scrollIntoView({ block: 'end', behavior: 'instant' });
+      else scroller.scrollTo(0, scroller.scrollHeight);
+
+      await frames();
+
+      const h = scroller.scrollHeight;
+      if (h === lastHeight && Date.now() - lastMutation >= quietMs) break;
+      lastHeight = h;
+    }
+  } finally {
+    observer.disconnect();
+  }
+
+  // Go top for nicer screenshot header
+  scroller.scrollTo(0, 0);
+  await frames();
+};
+
+// Finish every CSS animation/transition instantly, so "rendered" states that
+// wait on animations are reached at once and the shot has no half-faded
+// parts. Durations are zeroed (not `animation: none`) so fill-mode end
+// states are still applied.
+(() => {
+  const css =
+    '*, *::before, *::after {' +
+    ' animation-duration: 0s !important; animation-delay: 0s !important;' +
+    ' transition-duration: 0s !important; transition-delay: 0s !important;' +
+    ' scroll-behavior: auto !important; }';
+
+  const inject = () => {
+    const style = document.createElement('style');
+    style.textContent = css;
+    (document.head || document.documentElement).appendChild(style);
+  };
+
+  // Init scripts can run before <html> exists
+  if (document.documentElement) {
+    inject();
+  } else {
+    new MutationObserver((_, observer) => {
+      if (document.documentElement) {
+        observer.disconnect();
+        inject();
+      }
+    }).observe(document, { childList: true });
+  }
+})();
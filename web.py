@@ -1,11 +0,0 @@
-import os
-from fastapi import FastAPI
-
-app = FastAPI()
-
-@app.get("/health")
-def health():
-    return {"ok": True}
-
-# Fly معمولاً PORT رو ست می‌کنه، ولی fallback هم می‌ذاریم
-PORT = int(os.getenv("PORT", "8080"))
\ No newline at end of file